@@ -4,108 +4,102 @@ Simulation example demonstrating TIM matching
 
 import numpy as np
 import pandas as pd
+from joblib import Parallel, delayed
 from tim import TIMatcher
 
 def generate_simulated_data(n=1000, seed=42):
     """Generate simulated data for testing TIM"""
     np.random.seed(seed)
     
-    # Generate covariates
-    data = pd.DataFrame({
-        'age': np.random.normal(45, 15, n),
-        'income': np.random.exponential(50000, n),
-        'bmi': np.random.normal(25, 5, n),
-        'blood_pressure': np.random.normal(120, 15, n),
-        'cholesterol': np.random.normal(200, 40, n),
-        'gender': np.random.choice([0, 1], n),
-        'smoking': np.random.choice([0, 1], n, p=[0.7, 0.3]),
-        'education': np.random.choice([0, 1, 2], n, p=[0.3, 0.5, 0.2]),
-    })
+    # Generate covariates as one array, drawn in the same order as the columns
+    columns = ['age', 'income', 'bmi', 'blood_pressure', 'cholesterol',
+               'gender', 'smoking', 'education']
+    X = np.column_stack([
+        np.random.normal(45, 15, n),
+        np.random.exponential(50000, n),
+        np.random.normal(25, 5, n),
+        np.random.normal(120, 15, n),
+        np.random.normal(200, 40, n),
+        np.random.choice([0, 1], n),
+        np.random.choice([0, 1], n, p=[0.7, 0.3]),
+        np.random.choice([0, 1, 2], n, p=[0.3, 0.5, 0.2]),
+    ])
     
     # Generate treatment (with confounding)
-    treatment_logit = (
-        -3 +
-        0.02 * data['age'] + 
-        0.00001 * data['income'] + 
-        0.1 * data['bmi'] +
-        0.05 * data['blood_pressure'] +
-        0.01 * data['cholesterol'] +
-        0.5 * data['gender'] +
-        0.8 * data['smoking'] +
-        0.3 * data['education']
+    treatment_logit = -3 + X @ np.array(
+        [0.02, 0.00001, 0.1, 0.05, 0.01, 0.5, 0.8, 0.3]
     )
     treatment_prob = 1 / (1 + np.exp(-treatment_logit))
-    data['treatment'] = np.random.binomial(1, treatment_prob)
+    treatment = np.random.binomial(1, treatment_prob)
     
     # Generate outcome (with treatment effect)
     true_ate = 2.5
-    data['outcome'] = (
-        true_ate * data['treatment'] +
-        0.05 * data['age'] +
-        0.00005 * data['income'] +
-        0.2 * data['bmi'] +
-        0.08 * data['blood_pressure'] +
-        0.02 * data['cholesterol'] +
-        1.0 * data['gender'] +
-        1.5 * data['smoking'] +
-        0.5 * data['education'] +
+    outcome = (
+        true_ate * treatment +
+        X @ np.array([0.05, 0.00005, 0.2, 0.08, 0.02, 1.0, 1.5, 0.5]) +
         np.random.normal(0, 2, n)
     )
     
+    data = pd.DataFrame(X, columns=columns)
+    data[['gender', 'smoking', 'education']] = (
+        data[['gender', 'smoking', 'education']].astype(int)
+    )
+    data['treatment'] = treatment
+    data['outcome'] = outcome
+    
     return data, true_ate
 
-def run_simulation(n_iterations=10, n_samples=1000):
-    """Run simulation study"""
-    results = {
-        'iteration': [],
-        'estimated_ate': [],
-        'estimated_att': [],
-        'true_ate': [],
-        'bias': [],
-        'percent_bias': [],
-        'overlap_initial': [],
-        'overlap_final': [],
-        'treatment_retention': []
-    }
+def _one_iter(i, n_samples):
+    """Fit TIM on one simulated dataset, returning None on failure"""
+    print(f"\nIteration {i+1}")
+    
+    # Generate data
+    data, true_ate = generate_simulated_data(n=n_samples, seed=i)
+    
+    # Fit matcher
+    matcher = TIMatcher(
+        treatment_col='treatment',
+        outcome_col='outcome',
+        continuous_cols=['age', 'income', 'bmi', 'blood_pressure', 'cholesterol'],
+        discrete_cols=['gender', 'smoking', 'education'],
+        coarsen_bins=4
+    )
     
-    for i in range(n_iterations):
-        print(f"\nIteration {i+1}/{n_iterations}")
+    try:
+        matcher.fit(data)
         
-        # Generate data
-        data, true_ate = generate_simulated_data(n=n_samples, seed=i)
+        print(f"ATE: {matcher.ate_:.4f} (True: {true_ate:.4f})")
+        print(f"Bias: {matcher.ate_ - true_ate:.4f}")
         
-        # Fit matcher
-        matcher = TIMatcher(
-            treatment_col='treatment',
-            outcome_col='outcome',
-            continuous_cols=['age', 'income', 'bmi', 'blood_pressure', 'cholesterol'],
-            discrete_cols=['gender', 'smoking', 'education'],
-            coarsen_bins=4
-        )
+        return {
+            'iteration': i+1,
+            'estimated_ate': matcher.ate_,
+            'estimated_att': matcher.att_,
+            'true_ate': true_ate,
+            'bias': matcher.ate_ - true_ate,
+            'percent_bias': 100 * (matcher.ate_ - true_ate) / true_ate,
+            'overlap_initial': matcher.overlap_initial_,
+            'overlap_final': matcher.overlap_final_,
+            'treatment_retention': matcher.treatment_retention_
+        }
         
-        try:
-            matcher.fit(data)
-            
-            # Store results
-            results['iteration'].append(i+1)
-            results['estimated_ate'].append(matcher.ate_)
-            results['estimated_att'].append(matcher.att_)
-            results['true_ate'].append(true_ate)
-            results['bias'].append(matcher.ate_ - true_ate)
-            results['percent_bias'].append(100 * (matcher.ate_ - true_ate) / true_ate)
-            results['overlap_initial'].append(matcher.overlap_initial_)
-            results['overlap_final'].append(matcher.overlap_final_)
-            results['treatment_retention'].append(matcher.treatment_retention_)
-            
-            print(f"ATE: {matcher.ate_:.4f} (True: {true_ate:.4f})")
-            print(f"Bias: {matcher.ate_ - true_ate:.4f}")
-            
-        except Exception as e:
-            print(f"Error in iteration {i+1}: {e}")
-            continue
+    except Exception as e:
+        print(f"Error in iteration {i+1}: {e}")
+        return None
+
+def run_simulation(n_iterations=10, n_samples=1000, n_jobs=-1):
+    """Run simulation study, fitting iterations in parallel"""
+    rows = Parallel(n_jobs=n_jobs, backend='loky')(
+        delayed(_one_iter)(i, n_samples) for i in range(n_iterations)
+    )
     
     # Summarize results
-    results_df = pd.DataFrame(results)
+    results_df = pd.DataFrame(
+        [r for r in rows if r is not None],
+        columns=['iteration', 'estimated_ate', 'estimated_att', 'true_ate', 'bias',
+                 'percent_bias', 'overlap_initial', 'overlap_final',
+                 'treatment_retention']
+    )
     
     print("\n" + "="*60)
     print("SIMULATION SUMMARY")
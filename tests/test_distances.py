@@ -0,0 +1,101 @@
+"""
+Unit tests for discrete distance calculation
+"""
+
+import pytest
+import numpy as np
+import pandas as pd
+from tim.distances import (
+    find_max_crosstab,
+    algo_distance_crosstab,
+    build_disc_distance_table,
+    unified_distance,
+)
+
+def generate_discrete_data():
+    """Small dataset with two discrete columns sharing 0/1 labels"""
+    return pd.DataFrame({
+        'g': [0, 0, 1, 1, 0, 1, 0, 1],
+        'h': [0, 1, 1, 1, 0, 0, 1, 1],
+        'e': [0, 1, 2, 2, 1, 0, 2, 1],
+        't': [1, 0, 1, 0, 1, 0, 0, 1],
+        'y': np.arange(8.0),
+    })
+
+class TestDiscreteDistances:
+
+    def test_tables_are_per_column(self):
+        """Test that columns sharing labels keep their own distances"""
+        data = generate_discrete_data()
+        disc_dist = algo_distance_crosstab(data, ['g', 'h', 'e'], 't', 'y')
+        tables = build_disc_distance_table(disc_dist, data)
+
+        assert tables['g'][1][0, 1] == pytest.approx(0.25)
+        assert tables['h'][1][0, 1] == pytest.approx(7 / 15)
+        assert tables['g'][1][0, 1] != pytest.approx(tables['h'][1][0, 1])
+
+    def test_missing_values_get_no_distance_rows(self):
+        """Test that NaN is left out of the pairwise distances"""
+        data = generate_discrete_data().astype({'g': float})
+        data.loc[6, 'g'] = np.nan
+        disc_dist = algo_distance_crosstab(data, ['g', 'h', 'e'], 't', 'y')
+
+        assert disc_dist[['Attribute_1', 'Attribute_2']].notna().all().all()
+        # Rows with a missing value are skipped as if they were dropped
+        expected = algo_distance_crosstab(data.drop(index=6), ['g', 'h', 'e'], 't', 'y')
+        pd.testing.assert_frame_equal(disc_dist, expected)
+
+    def test_table_rejects_unknown_values(self):
+        """Test that distances for values absent from the data raise"""
+        data = generate_discrete_data()
+        disc_dist = algo_distance_crosstab(data, ['g', 'h', 'e'], 't', 'y')
+        disc_dist.loc[len(disc_dist)] = ['e', 1, 3, 0.5]
+
+        with pytest.raises(KeyError):
+            build_disc_distance_table(disc_dist, data)
+
+    def test_unified_distance_uses_column_tables(self):
+        """Test that each control sums the distances of its own columns"""
+        data = generate_discrete_data()
+        disc_dist = algo_distance_crosstab(data, ['g', 'h', 'e'], 't', 'y')
+        stratum = data.iloc[[0, 1, 3, 5]].copy()
+
+        unified_distance([(['e'], stratum)], 't', 'y', [], disc_dist,
+                         ['g', 'h', 'e'], data)
+
+        expected = [np.nan, 7 / 15, 0.25 + 7 / 15, 0.25]
+        np.testing.assert_allclose(stratum['discrete_distance'], expected)
+
+    def test_missing_value_contributes_nothing(self):
+        """Test that a value without a table entry adds zero distance"""
+        data = generate_discrete_data()
+        disc_dist = algo_distance_crosstab(data, ['g', 'h', 'e'], 't', 'y')
+        stratum = data.iloc[[0, 1, 3, 5]].astype({'h': float})
+        stratum.loc[1, 'h'] = np.nan
+
+        unified_distance([(['e'], stratum)], 't', 'y', [], disc_dist,
+                         ['g', 'h', 'e'], data)
+
+        expected = [np.nan, 0.0, 0.25 + 7 / 15, 0.25]
+        np.testing.assert_allclose(stratum['discrete_distance'], expected)
+
+class TestFindMaxCrosstab:
+
+    def test_distance(self):
+        """Test distance between two values of the first column"""
+        col1 = [0, 0, 1, 1, 2, 2, 2]
+        col2 = ['a', 'b', 'a', 'a', 'b', 'b', 'a']
+
+        assert find_max_crosstab(col1, col2, 0, 1) == pytest.approx(0.5)
+        assert find_max_crosstab(col1, col2, 1, 2) == pytest.approx(2 / 3)
+
+    @pytest.mark.parametrize('missing', [-1, 1.5, 5])
+    def test_missing_attribute(self, missing):
+        """Test that a value absent from the first column raises"""
+        col1 = [0, 0, 1, 1, 2, 2, 2]
+        col2 = ['a', 'b', 'a', 'a', 'b', 'b', 'a']
+
+        with pytest.raises(KeyError):
+            find_max_crosstab(col1, col2, 0, missing)
+        with pytest.raises(KeyError):
+            find_max_crosstab(col1, col2, missing, 2)
@@ -0,0 +1,49 @@
+"""
+Unit tests for treatment effect estimation
+"""
+
+import pytest
+import numpy as np
+import pandas as pd
+from tim.effects import calculate_ate, calculate_ate_att
+
+def generate_strata():
+    """Two hand-built strata, the second adjusted by inverse distance"""
+    stratum_a = pd.DataFrame({
+        'treatment': [1, 1, 0],
+        'outcome': [4.0, 6.0, 1.0],
+        'weights': [1.0, 1.0, 1.5],
+    })
+    stratum_b = pd.DataFrame({
+        'treatment': [1, 0, 0],
+        'outcome': [10.0, 2.0, 6.0],
+        'inverse_distance': [0.5, 1.0, 0.0],
+        'weights': [0.5, 0.25, 0.0],
+    })
+    return [(['x1', 'x2'], stratum_a), (['x1'], stratum_b)]
+
+class TestEffects:
+
+    def test_calculate_ate_att(self):
+        """Test CATE and ATT on hand-built strata"""
+        cate, att = calculate_ate_att(
+            generate_strata(), 'treatment', 'outcome', 'weights'
+        )
+
+        # Stratum effects 4 and 8, weighted by 2 and 1 treated units
+        assert cate == pytest.approx(16 / 3)
+        # Weighted means: treated 15 / 2.5, control 2 / 1.75
+        assert att == pytest.approx(6 - 8 / 7)
+
+    def test_calculate_ate_matches_cate(self):
+        """Test that calculate_ate returns the CATE"""
+        strata = generate_strata()
+        cate, _ = calculate_ate_att(strata, 'treatment', 'outcome', 'weights')
+
+        assert calculate_ate(strata, 'treatment', 'outcome', 'weights') == cate
+
+    def test_no_usable_strata(self):
+        """Test that strata without the weight column give None"""
+        strata = [(cov, df.drop(columns='weights')) for cov, df in generate_strata()]
+
+        assert calculate_ate_att(strata, 'treatment', 'outcome', 'weights') == (None, None)
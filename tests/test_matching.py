@@ -0,0 +1,114 @@
+"""
+Unit tests for exact matching with variable importance
+"""
+
+import pytest
+import numpy as np
+import pandas as pd
+from tim import TIMatcher
+from tim.matcher import _pack_codes
+from tim.utils import factorize_sorted
+
+def groupby_matching(df, treatment_col, variable_importance):
+    """Reference matching with pandas groupby"""
+    sorted_covariates = sorted(
+        variable_importance.keys(),
+        key=lambda x: variable_importance[x],
+        reverse=True
+    )
+
+    remaining_df = df.copy()
+    treatment_levels = df[treatment_col].nunique()
+    strata_list = []
+
+    for subset_size in range(len(sorted_covariates), 0, -1):
+        current_covariates = sorted_covariates[:subset_size]
+
+        for key, group in remaining_df.groupby(current_covariates, observed=True):
+            if group[treatment_col].nunique() == treatment_levels:
+                strata_list.append((current_covariates, group))
+                remaining_df = remaining_df.drop(index=group.index)
+
+        if remaining_df[remaining_df[treatment_col] == 1].empty:
+            break
+
+    matched_df_final = pd.concat([match[1] for match in strata_list]) \
+                      if strata_list else pd.DataFrame()
+    remaining_treated = remaining_df[remaining_df[treatment_col] == 1]
+
+    return strata_list, remaining_treated, remaining_df, matched_df_final
+
+def generate_coarsened_data(seed, n_wide=0):
+    """
+    Coarsened-style data with unused categories, NaN keys and a
+    non-default index; n_wide adds categorical columns whose codes are
+    too wide to pack into 64 bits together.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(100, 400))
+
+    data = pd.DataFrame({
+        # Bins that no value falls into stay as unused categories
+        'a': pd.cut(rng.normal(0, 1, n), bins=[-10, -1, 0, 1, 10, 20]),
+        'b': pd.cut(rng.normal(0, 1, n), bins=4),
+        'g': rng.integers(0, 2, n).astype(float),
+        'e': rng.integers(0, 3, n),
+        't': rng.integers(0, 2, n),
+        'y': rng.random(n),
+    }, index=rng.permutation(n) * 3 + 100)
+    data.loc[data.index[rng.choice(n, 5)], 'g'] = np.nan
+    data.loc[data.index[rng.choice(n, 3)], 'b'] = np.nan
+
+    for k in range(n_wide):
+        data[f'w{k}'] = pd.Categorical(
+            rng.choice([0, 1, 998, 999], n), categories=range(1000)
+        )
+    return data
+
+def assert_same_matching(result, expected):
+    """Compare strata keys, rows and order plus the leftover frames"""
+    assert len(result[0]) == len(expected[0])
+    for (cov, stratum), (ref_cov, ref_stratum) in zip(result[0], expected[0]):
+        assert cov == ref_cov
+        pd.testing.assert_frame_equal(stratum, ref_stratum)
+    for k in (1, 2, 3):
+        pd.testing.assert_frame_equal(result[k], expected[k])
+
+class TestExactMatching:
+
+    @pytest.mark.parametrize('seed', range(8))
+    def test_matches_groupby(self, seed):
+        """Test matching against the groupby reference"""
+        data = generate_coarsened_data(seed)
+        covariates = ['a', 'b', 'g', 'e']
+        rng = np.random.default_rng(seed)
+        importance = dict(zip(covariates, rng.random(len(covariates))))
+
+        matcher = TIMatcher('t', 'y', ['a', 'b'], ['g', 'e'])
+        result = matcher._exact_matching_with_importance(
+            data, treatment_col='t', covariate_cols=covariates,
+            variable_importance=importance
+        )
+
+        assert_same_matching(result, groupby_matching(data, 't', importance))
+
+    @pytest.mark.parametrize('seed', range(2))
+    def test_matches_groupby_unpacked(self, seed):
+        """Test the fallback for keys wider than 64 bits"""
+        data = generate_coarsened_data(seed, n_wide=7)
+        covariates = ['a', 'b', 'g', 'e'] + [f'w{k}' for k in range(7)]
+        rng = np.random.default_rng(seed)
+        importance = dict(zip(covariates, rng.random(len(covariates))))
+
+        all_codes = np.column_stack(
+            [factorize_sorted(data[col])[0] for col in covariates]
+        )
+        assert _pack_codes(all_codes) is None
+
+        matcher = TIMatcher('t', 'y', ['a', 'b'], ['g', 'e'])
+        result = matcher._exact_matching_with_importance(
+            data, treatment_col='t', covariate_cols=covariates,
+            variable_importance=importance
+        )
+
+        assert_same_matching(result, groupby_matching(data, 't', importance))
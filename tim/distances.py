@@ -6,83 +6,217 @@ import numpy as np
 import pandas as pd
 from itertools import combinations
 
+from .utils import factorize_sorted
+
+
+def _crosstab_counts(col1, col2):
+    """
+    Joint count matrix of two columns, rows ordered by the sorted values of col1.
+    """
+    u1, i1 = np.unique(np.asarray(col1), return_inverse=True)
+    u2, i2 = np.unique(np.asarray(col2), return_inverse=True)
+    
+    counts = np.zeros((u1.size, u2.size), dtype=np.int64)
+    np.add.at(counts, (i1.ravel(), i2.ravel()), 1)
+    return u1, counts
+
 
 def find_max_crosstab(col1, col2, attribute1, attribute2):
     """
     Calculate distance between two attributes across categories.
     """
-    data = {'c1': list(col1), 'c2': list(col2)}
-    df = pd.DataFrame(data)
+    u1, counts = _crosstab_counts(col1, col2)
     
-    attribute1_joint_counts = pd.crosstab(index=df['c1'], columns=df['c2'])
+    # searchsorted gives an insertion point, so check the value is there
+    a, b = np.minimum(np.searchsorted(u1, [attribute1, attribute2]), u1.size - 1)
+    for attribute, idx in ((attribute1, a), (attribute2, b)):
+        if u1.size == 0 or u1[idx] != attribute:
+            raise KeyError(attribute)
     
-    distance = 0
-    for i in df['c2'].unique():
-        prob_attr1 = (attribute1_joint_counts[i].loc[attribute1] / 
-                     attribute1_joint_counts.loc[attribute1].sum())
-        prob_attr2 = (attribute1_joint_counts[i].loc[attribute2] / 
-                     attribute1_joint_counts.loc[attribute2].sum())
-        
-        if prob_attr1 >= prob_attr2:
-            distance += prob_attr1
-        else:
-            distance += prob_attr2
+    prob_attr1 = counts[a] / counts[a].sum()
+    prob_attr2 = counts[b] / counts[b].sum()
     
-    distance = distance - 1
+    distance = np.maximum(prob_attr1, prob_attr2).sum() - 1
     return distance
 
 
-def algo_distance_crosstab(df, disc_columns, treatment_col, outcome_col):
+def algo_distance_crosstab(df, disc_columns, treatment_col, outcome_col, 
+                           codes=None):
     """
     Calculate pairwise distances for discrete variables.
+    
+    codes may map column names to precomputed factorize_sorted results
+    for df; columns missing from it are encoded here.
     """
     df = df.drop([outcome_col, treatment_col], axis=1)
     cols = disc_columns
-    results = []
+    codes = codes or {}
+    encoded = {i: codes[i] if i in codes else factorize_sorted(df[i]) for i in cols}
+    
+    # Conditional distributions P(j | i) for every ordered pair of columns
+    tabs = {}
+    for i in cols:
+        codes_i, values_i = encoded[i]
+        for j in cols:
+            if i != j:
+                codes_j, values_j = encoded[j]
+                seen = (codes_i >= 0) & (codes_j >= 0)
+                # Widen the narrow codes before forming the joint index
+                counts = np.bincount(
+                    codes_i[seen].astype(np.intp) * len(values_j) + codes_j[seen],
+                    minlength=len(values_i) * len(values_j)
+                ).reshape(len(values_i), len(values_j))
+                row_sums = counts.sum(axis=1, keepdims=True)
+                tabs[(i, j)] = counts / np.maximum(row_sums, 1)
+    
+    # Missing values have no code, so they get no distance rows
+    uniques = {i: df[i].dropna().unique() for i in cols}
+    n_rows = sum(len(v) * (len(v) - 1) // 2 for v in uniques.values())
+    col_name = np.empty(n_rows, dtype=object)
+    attr1 = np.empty(n_rows, dtype=object)
+    attr2 = np.empty(n_rows, dtype=object)
+    dist = np.zeros(n_rows)
     
+    row = 0
     for i in cols:
-        for current_combination in combinations(df[i].unique(), 2):
+        for current_combination in combinations(uniques[i], 2):
+            a, b = encoded[i][1].get_indexer(current_combination)
+            if a < 0 or b < 0:
+                raise KeyError(current_combination[0] if a < 0 else current_combination[1])
             total = 0
             for j in cols:
                 if i != j:
-                    dist = find_max_crosstab(
-                        col1=df[i], 
-                        col2=df[j],
-                        attribute1=current_combination[0],
-                        attribute2=current_combination[1]
-                    )
-                    total += dist
-            
-            total_dist = total / (len(cols) - 1) if len(cols) > 1 else 0
+                    probs = tabs[(i, j)]
+                    total += np.maximum(probs[a], probs[b]).sum() - 1
             
-            results.append({
-                'Column_Name': i,
-                'Attribute_1': current_combination[0],
-                'Attribute_2': current_combination[1],
-                'Total_Distance': total_dist
-            })
-    
-    results_df = pd.DataFrame(results)
+            col_name[row] = i
+            attr1[row] = current_combination[0]
+            attr2[row] = current_combination[1]
+            dist[row] = total / (len(cols) - 1) if len(cols) > 1 else 0
+            row += 1
+    
+    results_df = pd.DataFrame({
+        'Column_Name': col_name,
+        'Attribute_1': attr1,
+        'Attribute_2': attr2,
+        'Total_Distance': dist
+    }).infer_objects()
     return results_df
 
 
+def _nearest_treated_distance(values, treated_mask, ctrl_mask):
+    """
+    Distance from each control value to its nearest treated value.
+    """
+    treated = np.sort(values[treated_mask])
+    control = values[ctrl_mask]
+    
+    # Nearest treated value sits on either side of the insertion point
+    idx = np.searchsorted(treated, control)
+    left = treated[np.maximum(idx - 1, 0)]
+    right = treated[np.minimum(idx, len(treated) - 1)]
+    return np.minimum(np.abs(control - left), np.abs(control - right))
+
+
+def build_disc_distance_table(disc_distance, data, codes=None):
+    """
+    Build dense per-column distance matrices for discrete variables.
+    
+    Parameters
+    ----------
+    disc_distance : pd.DataFrame
+        Pairwise distances from algo_distance_crosstab
+    data : pd.DataFrame
+        Data holding every value the discrete columns can take
+    codes : dict, optional
+        Precomputed factorize_sorted results, reused for their value index
+        
+    Returns
+    -------
+    dict
+        Column name -> (values index, matrix indexed by value codes)
+    """
+    tables = {}
+    for col, rows in disc_distance.groupby('Column_Name', sort=False):
+        _, uniques = codes[col] if codes and col in codes else factorize_sorted(data[col])
+        
+        a = uniques.get_indexer(rows['Attribute_1'])
+        b = uniques.get_indexer(rows['Attribute_2'])
+        
+        # A -1 index would silently write into the last row or column
+        unknown = (a < 0) | (b < 0)
+        if unknown.any():
+            k = np.flatnonzero(unknown)[0]
+            value = rows['Attribute_1'].iloc[k] if a[k] < 0 else rows['Attribute_2'].iloc[k]
+            raise KeyError(f"{col}: {value!r} is not a value of the column")
+        
+        table = np.zeros((len(uniques), len(uniques)))
+        table[a, b] = rows['Total_Distance'].to_numpy()
+        table[b, a] = rows['Total_Distance'].to_numpy()
+        tables[col] = (uniques, table)
+    return tables
+
+
+def _accumulate_distances(continuous, codes, tables, treated_mask, ctrl_mask):
+    """
+    Total continuous and discrete distance of each control unit.
+    
+    continuous holds one raw column per continuous covariate in its own
+    dtype, while totals are accumulated in float64; codes holds the
+    factorized values of each discrete covariate (-1 when a value has no
+    entry), with the matching distance matrix at the same position in
+    tables.
+    """
+    n_ctrl = int(ctrl_mask.sum())
+    
+    continuous_total = np.zeros(n_ctrl)
+    for k in range(continuous.shape[1]):
+        continuous_total += _nearest_treated_distance(
+            continuous[:, k], treated_mask, ctrl_mask
+        )
+    
+    # The stratum's first row is the reference value for each column;
+    # values missing from the table (code -1) contribute nothing
+    discrete_total = np.zeros(n_ctrl)
+    for k, table in enumerate(tables):
+        ref = codes[0, k]
+        ctrl = codes[ctrl_mask, k]
+        discrete_total += np.where((ref >= 0) & (ctrl >= 0), table[ref, ctrl], 0)
+    
+    return continuous_total, discrete_total
+
+
+def _control_column(values, ctrl_mask):
+    """
+    Expand per-control values to a full column, NaN for treated rows.
+    """
+    column = np.full(ctrl_mask.shape[0], np.nan)
+    column[ctrl_mask] = values
+    return column
+
+
 def unified_distance(matched_dfs, treatment, outcome, continuous_cols,
-                    disc_distance, matched_list, data):
+                    disc_distance, matched_list, data, disc_tables=None):
     """
     Calculate unified distance incorporating both continuous and discrete variables.
+    
+    disc_tables may be passed from build_disc_distance_table to reuse
+    prebuilt lookup matrices; otherwise they are built from disc_distance.
     """
+    if disc_tables is None:
+        disc_tables = build_disc_distance_table(disc_distance, data)
+    
     for covariates, matched_df in matched_dfs:
         cov = covariates
         matched = matched_df.drop(cov, axis=1)
         
         common_values = list(set(matched.columns).intersection(set(continuous_cols)))
-        df_merged = pd.merge(
-            matched, 
-            data[common_values], 
-            left_index=True, 
-            right_index=True,
-            suffixes=('', '_continuous')
-        )
+        
+        # Attach raw continuous values next to their coarsened bins;
+        # matched is already a fresh frame from drop, so no merge is needed
+        df_merged = matched
+        for col in common_values:
+            df_merged[col + '_continuous'] = data[col].reindex(matched.index).to_numpy()
         
         if any(column in matched_list for column in df_merged.columns):
             continuous_list = [i for i in df_merged.columns if 'continuous' in i]
@@ -92,68 +226,53 @@ def unified_distance(matched_dfs, treatment, outcome, continuous_cols,
             discrete_list = [item for item in disc 
                            if not any(item in word for word in continuous_list)]
             
-            # Initialize distance columns
-            df_merged['continuous_distance'] = np.nan
-            df_merged['discrete_distance'] = np.nan
-            
             num_discrete = len(discrete_list)
             num_continuous = len(continuous_list)
             total_variables = len(matched_list)
             inverse_weight = 1 - (num_discrete + num_continuous) / total_variables
             
-            # Calculate continuous distances
-            total_dist = [0] * df_merged[df_merged[treatment] == 0][continuous_list].shape[0]
+            treatment_values = df_merged[treatment].to_numpy()
+            ctrl_mask = treatment_values == 0
+            treated_mask = treatment_values == 1
             
-            for i in continuous_list:
-                training_1 = df_merged[df_merged[treatment] == 1][i].values
-                training_0 = df_merged[df_merged[treatment] == 0][i].values
-                distances = [np.min(np.abs(val - training_1)) for val in training_0]
-                total_dist = [sum(i) for i in zip(total_dist, distances)]
+            # Columns without a distance table contribute nothing
+            coded = [i for i in discrete_list if i in disc_tables]
+            codes = np.empty((len(df_merged), len(coded)), dtype=np.intp)
+            for k, i in enumerate(coded):
+                codes[:, k] = disc_tables[i][0].get_indexer(df_merged[i])
             
-            df_merged.loc[df_merged[treatment] == 0, 'continuous_distance'] = total_dist
+            # The per-kind totals are kept because they are exposed on the
+            # matched strata
+            continuous_total, discrete_total = _accumulate_distances(
+                df_merged[continuous_list].to_numpy(),
+                codes,
+                [disc_tables[i][1] for i in coded],
+                treated_mask,
+                ctrl_mask
+            )
             
-            # Calculate discrete distances
-            if discrete_list:
-                total_dist = [0] * df_merged[df_merged[treatment] == 0][discrete_list].shape[0]
-                
-                for i in discrete_list:
-                    treatment_element = df_merged[i].iloc[0]
-                    distances = []
-                    
-                    for j, k in df_merged[df_merged[treatment] == 0].iterrows():
-                        control_element = df_merged[i].loc[j]
-                        row = disc_distance[
-                            ((disc_distance['Attribute_1'] == treatment_element) & 
-                             (disc_distance['Attribute_2'] == control_element)) |
-                            ((disc_distance['Attribute_1'] == control_element) & 
-                             (disc_distance['Attribute_2'] == treatment_element))
-                        ]
-                        dist = row["Total_Distance"].values[0] if not row.empty else 0
-                        distances.append(dist)
-                    
-                    total_dist = [sum(i) for i in zip(total_dist, distances)]
-                
-                df_merged.loc[df_merged[treatment] == 0, 'discrete_distance'] = total_dist
+            grand_total = continuous_total + discrete_total
             
-            # Calculate grand total
-            df_merged['grand_total'] = (df_merged['continuous_distance'].fillna(0) + 
-                                       df_merged['discrete_distance'].fillna(0))
-            df_merged.loc[df_merged[treatment] == 1, 'grand_total'] = np.nan
+            df_merged['continuous_distance'] = _control_column(continuous_total, ctrl_mask)
+            df_merged['discrete_distance'] = (
+                _control_column(discrete_total, ctrl_mask) if discrete_list else np.nan
+            )
+            df_merged['grand_total'] = _control_column(grand_total, ctrl_mask)
             
             # Inverse Min-Max Normalization
-            min_value = df_merged[df_merged[treatment] == 0]['grand_total'].min()
-            max_value = df_merged[df_merged[treatment] == 0]['grand_total'].max()
+            min_value = np.nanmin(grand_total)
+            max_value = np.nanmax(grand_total)
             
             if max_value > min_value:
-                df_merged['inverse_distance'] = (
-                    1 - (df_merged['grand_total'] - min_value) / (max_value - min_value)
-                )
+                control_inverse = 1 - (grand_total - min_value) / (max_value - min_value)
+                control_inverse[np.isnan(control_inverse)] = 1
             else:
-                df_merged['inverse_distance'] = 1
+                control_inverse = 1
             
-            df_merged.loc[(df_merged[treatment] == 0) & 
-                         (df_merged['inverse_distance'].isna()), 'inverse_distance'] = 1
-            df_merged.loc[df_merged[treatment] == 1, 'inverse_distance'] = inverse_weight
+            inverse_distance = np.full(len(df_merged), np.nan)
+            inverse_distance[ctrl_mask] = control_inverse
+            inverse_distance[treated_mask] = inverse_weight
+            df_merged['inverse_distance'] = inverse_distance
             
             # Add columns to matched_df
             matched_df['discrete_distance'] = df_merged['discrete_distance']
@@ -1,6 +1,10 @@
 """
 Treatment effect estimation
 """
+
+import numpy as np
+
+
 def calculate_ate(matched_dfs, treatment, outcome, weight):
     """
     Calculate Conditional Average Treatment Effect (CATE).
@@ -21,29 +25,84 @@ def calculate_ate(matched_dfs, treatment, outcome, weight):
     float
        Conditional Average Treatment Effect (CATE)
     """
-    ate_list = []
+    return calculate_ate_att(matched_dfs, treatment, outcome, weight)[0]
+
+
+def calculate_ate_att(matched_dfs, treatment, outcome, weight):
+    """
+    Calculate CATE and ATT from matched strata.
+    
+    The CATE averages the stratum effects, each weighted by its number of
+    treated units. The ATT is the difference between the weighted outcome
+    means of all matched treated and control units, using the matching
+    weights in the weight column. It is the weighted difference in means
+    estimator of CEM. It differs from the CATE because the inverse-distance
+    factors in those weights change how much each stratum contributes.
+    
+    Parameters
+    ----------
+    matched_dfs : list of tuples
+        List of (covariates, matched_df) tuples
+    treatment : str
+        Treatment column name
+    outcome : str
+        Outcome column name
+    weight : str
+        Weight column name
+        
+    Returns
+    -------
+    tuple
+        (CATE, ATT), each None if no stratum could be evaluated
+    """
+    ate_num = 0.0
+    ate_den = 0
+    # Weighted outcome sums and weight totals for treated and controls
+    treated_wy = 0.0
+    treated_w = 0.0
+    control_wy = 0.0
+    control_w = 0.0
     
     for covariates, matched_df in matched_dfs:
         if {treatment, outcome, weight}.issubset(matched_df.columns):
-            treated = matched_df[matched_df[treatment] == 1]
-            control = matched_df[matched_df[treatment] == 0]
+            treated_mask = matched_df[treatment].to_numpy() == 1
+            y = matched_df[outcome].to_numpy()
             
-            n_treat = treated.shape[0]
-            n_control = control.shape[0]
+            n_treat = np.count_nonzero(treated_mask)
+            if n_treat == 0:
+                continue
             
-            treated_effect = treated[outcome].sum() / n_treat
+            treated_effect = y[treated_mask].mean()
+            control_y = y[~treated_mask]
             
             if "inverse_distance" in matched_df.columns:
-                control_effect = ((control[outcome] * control["inverse_distance"]).sum() / 
-                                control["inverse_distance"].sum())
+                w = matched_df["inverse_distance"].to_numpy()[~treated_mask]
+                if w.sum() > 0:
+                    control_effect = np.average(control_y, weights=w)
+                else:
+                    control_effect = control_y.mean()
             else:
-                control_effect = control[outcome].sum() / n_control
+                control_effect = control_y.mean()
             
             ate = treated_effect - control_effect
             
-            for _ in range(n_treat):
-                ate_list.append(ate)
+            ate_num += ate * n_treat
+            ate_den += n_treat
+            
+            # Units without a defined weight are left out of the ATT
+            weights = matched_df[weight].to_numpy(dtype=np.float64)
+            defined = ~np.isnan(weights)
+            t = treated_mask & defined
+            c = ~treated_mask & defined
+            treated_wy += weights[t] @ y[t]
+            treated_w += weights[t].sum()
+            control_wy += weights[c] @ y[c]
+            control_w += weights[c].sum()
     
-    final_ate = sum(ate_list) / len(ate_list) if ate_list else None
+    final_ate = ate_num / ate_den if ate_den else None
+    if treated_w > 0 and control_w > 0:
+        final_att = treated_wy / treated_w - control_wy / control_w
+    else:
+        final_att = None
     
-    return final_ate
+    return final_ate, final_att
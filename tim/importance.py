@@ -4,8 +4,6 @@ Confounder importance calculation
 
 import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split, GridSearchCV
-from sklearn.linear_model import Ridge
 
 
 def confounder_importance_conti(df, outcome_col, treatment_col):
@@ -26,48 +24,29 @@ def confounder_importance_conti(df, outcome_col, treatment_col):
     pd.Series
         Normalized confounder importance scores
     """
-    df_out = df.copy()
+    alphas = [0.1, 1.0, 10, 100]
     
-    # Outcome association
-    X_out = df_out.drop([outcome_col], axis=1)
-    y_out = df_out[outcome_col]
-    X_train, X_test, y_train, y_test = train_test_split(
-        X_out, y_out, train_size=0.7, random_state=42
-    )
+    # Standardize so coefficient magnitudes are comparable across covariates
+    X_out = df.drop([outcome_col], axis=1)
+    X = _standardize(X_out.to_numpy(dtype=np.float64))
     
-    # Hyperparameter tuning for outcome
-    ridge = Ridge(random_state=43)
-    params = {'alpha': [0.1, 1.0, 10, 100]}
-    GS = GridSearchCV(
-        estimator=ridge, 
-        param_grid=params, 
-        cv=10, 
-        n_jobs=-1, 
-        verbose=False, 
-        scoring='r2'
-    )
-    GS.fit(X_train, y_train)
-    best_ridge = Ridge(alpha=GS.best_params_["alpha"], random_state=43)
-    best_ridge.fit(X_train, y_train)
+    # The treatment design is the outcome design without the treatment column
+    keep = np.asarray(X_out.columns != treatment_col)
     
-    # Extract outcome coefficients
-    outcome_coefficients = pd.Series(best_ridge.coef_, index=X_out.columns)
-    outcome_coefficients = np.abs(outcome_coefficients)
+    # Outcome association
+    y_out = df[outcome_col].to_numpy(dtype=np.float64)
+    outcome_coefficients = pd.Series(
+        np.abs(_ridge_loo_coefficients(X, y_out, alphas)), 
+        index=X_out.columns
+    )
     
     # Treatment association
-    X_out = df_out.drop([treatment_col, outcome_col], axis=1)
-    y_out = df_out[treatment_col]
-    X_train, X_test, y_train, y_test = train_test_split(
-        X_out, y_out, train_size=0.7, random_state=42
+    y_out = df[treatment_col].to_numpy(dtype=np.float64)
+    treatment_coefficients = pd.Series(
+        np.abs(_ridge_loo_coefficients(X[:, keep], y_out, alphas)), 
+        index=X_out.columns[keep]
     )
     
-    GS.fit(X_train, y_train)
-    best_ridge.fit(X_train, y_train)
-    
-    # Extract treatment coefficients
-    treatment_coefficients = pd.Series(best_ridge.coef_, index=X_out.columns)
-    treatment_coefficients = np.abs(treatment_coefficients)
-    
     # Calculate confounder importance
     confounder_importance = abs(outcome_coefficients + treatment_coefficients)
     
@@ -83,3 +62,43 @@ def confounder_importance_conti(df, outcome_col, treatment_col):
     
     confounder_importance = confounder_importance.drop(treatment_col)
     return confounder_importance
+
+
+def _standardize(X):
+    """
+    Center columns and scale them to unit variance (constant columns unscaled).
+    """
+    X = X - X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1
+    return X / scale
+
+
+def _ridge_loo_coefficients(X, y, alphas):
+    """
+    Ridge coefficients for a centered design, with alpha chosen by
+    leave-one-out error as in RidgeCV.
+    
+    Every alpha reuses one SVD of X, which gives the leave-one-out (PRESS)
+    residuals in closed form.
+    """
+    n = X.shape[0]
+    y = y - y.mean()
+    U, s, Vt = np.linalg.svd(X, full_matrices=False)
+    Uty = U.T @ y
+    
+    best_error = np.inf
+    best_coef = None
+    for alpha in alphas:
+        d = s / (s ** 2 + alpha)
+        
+        # Hat matrix diagonal, including the unpenalized intercept
+        hat = 1 / n + (U ** 2) @ (s * d)
+        resid = y - U @ (s * d * Uty)
+        error = np.mean((resid / (1 - hat)) ** 2)
+        
+        if error < best_error:
+            best_error = error
+            best_coef = Vt.T @ (d * Uty)
+    
+    return best_coef
@@ -2,6 +2,7 @@
 Main TIM matcher class
 """
 
+import logging
 import numpy as np
 import pandas as pd
 import warnings
@@ -10,12 +11,44 @@ from cem.coarsen import coarsen
 from cem.imbalance import L1
 
 from .importance import confounder_importance_conti
-from .distances import algo_distance_crosstab, unified_distance
+from .distances import (
+    algo_distance_crosstab, build_disc_distance_table, unified_distance
+)
 from .weights import calculate_weights_from_best_matches_inverse_append
 from .effects import calculate_ate_att
+from .utils import factorize_sorted
 
 warnings.filterwarnings('ignore', category=FutureWarning)
 
+logger = logging.getLogger(__name__)
+
+
+def _pack_codes(all_codes):
+    """
+    Pack covariate codes into one uint64 key per row, first column highest.
+    
+    Returns the keys and, for each prefix length, the right shift that
+    leaves only that prefix; None when the codes need more than 64 bits.
+    """
+    widths = [int(c.max(initial=0)).bit_length() for c in all_codes.T]
+    if sum(widths) > 64:
+        return None
+    
+    packed = np.zeros(all_codes.shape[0], dtype=np.uint64)
+    for j, width in enumerate(widths):
+        # Missing codes (-1) are never active, so any value is fine here
+        column = np.maximum(all_codes[:, j], 0).astype(np.uint64)
+        packed = (packed << np.uint64(width)) | column
+    shifts = np.cumsum([0] + widths[::-1])[::-1]
+    return packed, shifts
+
+
+def _valid_strata(group_ids, treated, n_groups):
+    """Flag groups that contain both treated and control units"""
+    has_treated = np.bincount(group_ids[treated], minlength=n_groups) > 0
+    has_control = np.bincount(group_ids[~treated], minlength=n_groups) > 0
+    return has_treated & has_control
+
 
 class TIMatcher:
     """
@@ -36,6 +69,8 @@ class TIMatcher:
     
     Attributes
     ----------
+    data_ : pd.DataFrame
+        Input data passed to fit (a reference, not a copy)
     matched_data_ : pd.DataFrame
         Matched dataset after fitting
     weights_ : pd.Series
@@ -43,7 +78,8 @@ class TIMatcher:
     ate_ : float
         Average Treatment Effect
     att_ : float
-        Average Treatment Effect on the Treated
+        Average Treatment Effect on the Treated, as the difference in
+        weighted outcome means under weights_
     overlap_initial_ : float
         Initial overlap metric (L1)
     overlap_final_ : float
@@ -85,21 +121,24 @@ class TIMatcher:
         # Validate input
         self._validate_input(data)
         
-        # Store original data
-        self.data_ = data.copy()
+        # Keep a reference to the input; fit never mutates it
+        self.data_ = data
+        
+        # Work on narrower dtypes; the outcome keeps its precision
+        data = self._downcast(data)
         
         # Calculate initial overlap
         initial_data = data.drop([self.outcome_col], axis=1)
         self.overlap_initial_ = L1(initial_data, self.treatment_col)
         
         # Step 1: Calculate confounder importance
-        print("Calculating confounder importance...")
+        logger.info("Calculating confounder importance...")
         self.confounder_importance_ = confounder_importance_conti(
             data, self.outcome_col, self.treatment_col
         )
         
         # Step 2: Coarsen continuous variables
-        print("Coarsening continuous variables...")
+        logger.info("Coarsening continuous variables...")
         X_coarse = coarsen(
             data, 
             self.treatment_col, 
@@ -108,29 +147,35 @@ class TIMatcher:
             columns=self.continuous_cols
         )
         
-        # Step 3: Perform exact matching with variable importance
-        print("Performing exact matching...")
+        # Encode each covariate once for matching and distances
         all_covariates = self.continuous_cols + self.discrete_cols
+        codes = {col: factorize_sorted(X_coarse[col]) for col in all_covariates}
+        
+        # Step 3: Perform exact matching with variable importance
+        logger.info("Performing exact matching...")
         matched_strata, unmatched_treated, unmatched_control, matched_df = \
             self._exact_matching_with_importance(
                 X_coarse, 
                 treatment_col=self.treatment_col,
                 covariate_cols=all_covariates,
-                variable_importance=self.confounder_importance_
+                variable_importance=self.confounder_importance_,
+                codes=codes
             )
         
         self.matched_strata_ = matched_strata
         self.matched_data_ = matched_df
         
         # Step 4: Calculate discrete distances
-        print("Calculating distances...")
+        logger.info("Calculating distances...")
         if self.discrete_cols:
             disc_dist = algo_distance_crosstab(
                 df=X_coarse, 
                 disc_columns=self.discrete_cols,
                 treatment_col=self.treatment_col,
-                outcome_col=self.outcome_col
+                outcome_col=self.outcome_col,
+                codes=codes
             )
+            disc_tables = build_disc_distance_table(disc_dist, data, codes=codes)
             
             # Calculate unified distance
             unified_distance(
@@ -140,19 +185,20 @@ class TIMatcher:
                 continuous_cols=self.continuous_cols,
                 disc_distance=disc_dist,
                 matched_list=all_covariates,
-                data=data
+                data=data,
+                disc_tables=disc_tables
             )
         
         # Step 5: Calculate weights
-        print("Calculating weights...")
+        logger.info("Calculating weights...")
         _, self.weights_ = calculate_weights_from_best_matches_inverse_append(
             matched_strata, 
             self.treatment_col
         )
         
         # Step 6: Calculate treatment effects
-        print("Calculating treatment effects...")
-        self.ate_ = calculate_ate(
+        logger.info("Calculating treatment effects...")
+        self.ate_, self.att_ = calculate_ate_att(
             matched_dfs=matched_strata,
             treatment=self.treatment_col,
             outcome=self.outcome_col,
@@ -163,13 +209,18 @@ class TIMatcher:
         final_df = matched_df.drop(self.outcome_col, axis=1)
         self.overlap_final_ = L1(final_df, self.treatment_col, self.weights_)
         
+        # Cache group sizes for retention and summary
+        orig_treatment = data[self.treatment_col].to_numpy()
+        matched_treatment = matched_df[self.treatment_col].to_numpy()
+        self._n_orig_t = np.count_nonzero(orig_treatment == 1)
+        self._n_orig_c = np.count_nonzero(orig_treatment == 0)
+        self._n_matched_t = np.count_nonzero(matched_treatment == 1)
+        self._n_matched_c = np.count_nonzero(matched_treatment == 0)
+        
         # Calculate treatment retention
-        self.treatment_retention_ = (
-            matched_df[matched_df[self.treatment_col] == 1].shape[0] /
-            data[data[self.treatment_col] == 1].shape[0]
-        )
+        self.treatment_retention_ = self._n_matched_t / self._n_orig_t
         
-        print("Matching complete!")
+        logger.info("Matching complete!")
         return self
     
     def _validate_input(self, data):
@@ -188,45 +239,113 @@ class TIMatcher:
                 f"Treatment column must be binary. Found {unique_treatment} unique values."
             )
     
+    def _downcast(self, data):
+        """
+        Narrow continuous covariates to float32 and integer discrete and
+        treatment columns to the smallest signed integer type holding
+        their values.
+        
+        Only the narrowed columns are new arrays; the rest are shared with
+        the input, which fit only reads.
+        """
+        dtypes = {
+            col: np.float32 for col in self.continuous_cols
+            if data[col].dtype == np.float64
+        }
+        for col in self.discrete_cols + [self.treatment_col]:
+            column = data[col]
+            if pd.api.types.is_integer_dtype(column) and len(column):
+                # A signed type fits hi exactly when it fits -hi - 1
+                lo, hi = int(column.min()), int(column.max())
+                dtype = np.min_scalar_type(min(lo, -hi - 1))
+                if dtype.kind == 'i' and dtype.itemsize < column.dtype.itemsize:
+                    dtypes[col] = dtype
+        return data.astype(dtypes, copy=False)
+    
     def _exact_matching_with_importance(self, df, treatment_col, covariate_cols, 
-                                       variable_importance):
+                                       variable_importance, codes=None):
         """
         Perform exact matching using variable importance ranking.
+        
+        codes may hold precomputed factorize_sorted results for df columns.
         """
         # Sort covariates by importance
-        sorted_covariates = sorted(
-            variable_importance.keys(), 
-            key=lambda x: variable_importance[x], 
-            reverse=True
-        )
+        importance = pd.Series(variable_importance, dtype=np.float64)
+        order = np.argsort(-importance.to_numpy(), kind='stable')
+        sorted_covariates = importance.index[order].tolist()
         
-        remaining_df = df.copy()
-        treatment_levels = df[treatment_col].nunique()
+        n_rows = len(df)
+        treated = df[treatment_col].to_numpy() == 1
+        
+        # Integer codes per covariate, in the same order groupby sorts keys;
+        # the matrix keeps the narrow dtype the codes come in
+        codes = codes or {}
+        col_codes = [
+            codes[col][0] if col in codes else factorize_sorted(df[col])[0]
+            for col in sorted_covariates
+        ]
+        all_codes = np.empty((n_rows, len(sorted_covariates)), 
+                             dtype=np.result_type(np.int8, *col_codes))
+        for j, column in enumerate(col_codes):
+            all_codes[:, j] = column
+        
+        # Shifting off trailing covariates of the packed key gives each
+        # level's composite key, ordered like the covariate tuples
+        packing = _pack_codes(all_codes)
+        
+        matched = np.zeros(n_rows, dtype=bool)
+        matched_positions = []
+        n_remaining_treated = int(np.count_nonzero(treated))
         strata_list = []
         
         # Iterate from all covariates down to single covariate
         for subset_size in range(len(sorted_covariates), 0, -1):
             current_covariates = sorted_covariates[:subset_size]
+            level_codes = all_codes[:, :subset_size]
             
-            # Group by current strata
-            grouped = remaining_df.groupby(current_covariates, observed=True)
+            # Unmatched rows with no missing key (groupby drops those)
+            active = np.flatnonzero(~matched & (level_codes >= 0).all(axis=1))
+            
+            if packing is not None:
+                packed, shifts = packing
+                keys = packed[active] >> np.uint64(shifts[subset_size])
+                group_ids = np.unique(keys, return_inverse=True)[1].ravel()
+            else:
+                # Too wide to pack: renumber after each column so the id
+                # stays below the row count and sorts like the tuples
+                group_ids = np.zeros(active.size, dtype=np.int64)
+                for j in range(subset_size):
+                    column = level_codes[active, j]
+                    packed = group_ids * (int(column.max(initial=0)) + 1) + column
+                    group_ids = np.unique(packed, return_inverse=True)[1].ravel()
+            n_groups = group_ids.max(initial=-1) + 1
             
             # Find valid strata (containing both treatment and control)
-            for key, group in grouped:
-                if group[treatment_col].nunique() == treatment_levels:
-                    strata_list.append((current_covariates, pd.DataFrame(group)))
-                    indices = pd.DataFrame(group).index
-                    remaining_df = remaining_df.drop(index=indices, errors='ignore')
+            valid = _valid_strata(group_ids, treated[active], n_groups)
+            
+            in_valid = valid[group_ids]
+            rows = active[in_valid]
+            row_groups = group_ids[in_valid]
+            order = np.argsort(row_groups, kind='stable')
+            rows = rows[order]
+            bounds = np.flatnonzero(np.diff(row_groups[order])) + 1
+            
+            if rows.size:
+                for positions in np.split(rows, bounds):
+                    strata_list.append((current_covariates, df.take(positions)))
+                matched[rows] = True
+                matched_positions.append(rows)
+                n_remaining_treated -= int(np.count_nonzero(treated[rows]))
             
             # Check if all treated units are matched
-            remaining_treated = remaining_df[remaining_df[treatment_col] == 1]
-            if remaining_treated.empty:
+            if n_remaining_treated == 0:
                 break
         
-        # Consolidate matched data
-        matched_df_final = pd.concat([match[1] for match in strata_list]) \
+        # Consolidate matched data with one take over the original frame
+        matched_df_final = df.take(np.concatenate(matched_positions)) \
                           if strata_list else pd.DataFrame()
         
+        remaining_df = df.take(np.flatnonzero(~matched))
         remaining_treated = remaining_df[remaining_df[treatment_col] == 1]
         
         return strata_list, remaining_treated, remaining_df, matched_df_final
@@ -247,10 +366,10 @@ class TIMatcher:
         print(f"Discrete covariates: {len(self.discrete_cols)}")
         print()
         print("Sample Sizes:")
-        print(f"  Original treated: {self.data_[self.data_[self.treatment_col]==1].shape[0]}")
-        print(f"  Original control: {self.data_[self.data_[self.treatment_col]==0].shape[0]}")
-        print(f"  Matched treated: {self.matched_data_[self.matched_data_[self.treatment_col]==1].shape[0]}")
-        print(f"  Matched control: {self.matched_data_[self.matched_data_[self.treatment_col]==0].shape[0]}")
+        print(f"  Original treated: {self._n_orig_t}")
+        print(f"  Original control: {self._n_orig_c}")
+        print(f"  Matched treated: {self._n_matched_t}")
+        print(f"  Matched control: {self._n_matched_c}")
         print(f"  Treatment retention: {self.treatment_retention_:.2%}")
         print()
         print("Balance:")
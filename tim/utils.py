@@ -2,5 +2,33 @@
 Utility functions for TIM
 """
 
-# Placeholder for future utility functions
-pass
+import numpy as np
+import pandas as pd
+
+
+def factorize_sorted(column):
+    """
+    Encode a column as integer codes following its sorted value order.
+    
+    Categorical columns reuse their category codes, so coarsened bins are
+    not hashed again. Missing values get code -1, and codes are stored in
+    the narrowest signed integer dtype that holds them.
+    
+    Parameters
+    ----------
+    column : pd.Series
+        Column to encode
+        
+    Returns
+    -------
+    tuple
+        (integer codes, pd.Index of the values each code stands for)
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes, uniques = column.cat.codes.to_numpy(), column.cat.categories
+    else:
+        codes, uniques = pd.factorize(column, sort=True)
+        uniques = pd.Index(uniques)
+    
+    dtype = np.min_scalar_type(-max(len(uniques), 1))
+    return codes.astype(dtype, copy=False), uniques
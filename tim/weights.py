@@ -2,9 +2,34 @@
 Weight calculation functions
 """
 
+import numpy as np
 import pandas as pd
 
 
+def _weights_kernel(treat, inv, stratum, M_treated, M_control):
+    """
+    Per-row weights and kept-row mask over the flattened strata.
+    
+    Treated rows weigh inv, controls the global control/treated ratio
+    times their stratum's treated/control ratio times inv; controls in
+    strata lacking either group get NaN and are not kept.
+    """
+    treated = treat == 1
+    control = treat == 0
+    t_count = np.bincount(stratum[treated], minlength=stratum.max(initial=-1) + 1)
+    c_count = np.bincount(stratum[control], minlength=t_count.size)
+    has_both = (t_count > 0) & (c_count > 0)
+    
+    stratum_ratio = np.divide(t_count, c_count, out=np.full(t_count.size, np.nan),
+                              where=has_both)
+    ratio = M_control / M_treated if M_treated else np.nan
+    
+    w = np.where(treated, 1.0, np.where(control, ratio * stratum_ratio[stratum], np.nan))
+    w *= inv
+    keep = treated | (control & has_both[stratum])
+    return w, keep
+
+
 def calculate_weights_from_best_matches_inverse_append(best_matches, treatment_col):
     """
     Calculate and append weights for matched units.
@@ -21,48 +46,30 @@ def calculate_weights_from_best_matches_inverse_append(best_matches, treatment_c
     tuple
         (best_matches with weights, concatenated weight series)
     """
+    # Flatten the strata into row arrays keyed by stratum id
+    treat = np.concatenate([match_df[treatment_col].to_numpy() for _, match_df in best_matches])
+    sizes = np.array([len(match_df) for _, match_df in best_matches])
+    stratum = np.repeat(np.arange(sizes.size), sizes)
+    
     # Global counts
-    M_treated = sum([len(match_df[match_df[treatment_col] == 1]) 
-                    for _, match_df in best_matches])
-    M_control = sum([len(match_df[match_df[treatment_col] == 0]) 
-                    for _, match_df in best_matches])
+    M_treated = int(np.count_nonzero(treat == 1))
+    M_control = int(np.count_nonzero(treat == 0))
     
-    weight_series_list = []
+    # Strata matched on every covariate get no inverse_distance column
+    inv = np.concatenate([
+        match_df['inverse_distance'].to_numpy() 
+        if 'inverse_distance' in match_df.columns else np.ones(len(match_df))
+        for _, match_df in best_matches
+    ])
     
-    for covariate_combination, match_df in best_matches:
-        treated_units = match_df[match_df[treatment_col] == 1]
-        control_units = match_df[match_df[treatment_col] == 0]
-        
-        n_stratum_treated = len(treated_units)
-        n_stratum_control = len(control_units)
-        
-        match_df["weights"] = float('nan')
-        
-        # Treated weights
-        match_df.loc[treated_units.index, "weights"] = 1
-        treated_weights = pd.Series(1, index=treated_units.index)
-        
-        # Adjust by inverse_distance if exists
-        if 'inverse_distance' in match_df.columns:
-            treated_units_inv = match_df.loc[treated_units.index, 'inverse_distance']
-            match_df.loc[treated_units.index, "weights"] *= treated_units_inv
-            treated_weights *= treated_units_inv
-        
-        weight_series_list.append(treated_weights)
-        
-        # Control weights
-        if n_stratum_treated > 0 and n_stratum_control > 0:
-            weight_control = (M_control / M_treated) * (n_stratum_treated / n_stratum_control)
-            
-            if 'inverse_distance' in match_df.columns:
-                control_units_inv = match_df.loc[control_units.index, 'inverse_distance']
-                match_df.loc[control_units.index, "weights"] = weight_control * control_units_inv
-                control_weights = pd.Series(weight_control, index=control_units.index) * control_units_inv
-            else:
-                match_df.loc[control_units.index, "weights"] = weight_control
-                control_weights = pd.Series(weight_control, index=control_units.index)
-            
-            weight_series_list.append(control_weights)
+    w, keep = _weights_kernel(treat, inv, stratum, M_treated, M_control)
+    
+    bounds = np.cumsum(sizes)[:-1]
+    for (covariate_combination, match_df), stratum_w in zip(best_matches, np.split(w, bounds)):
+        match_df["weights"] = stratum_w
     
-    weights = pd.concat(weight_series_list)
+    index = best_matches[0][1].index.append(
+        [match_df.index for _, match_df in best_matches[1:]]
+    )
+    weights = pd.Series(w[keep], index=index[keep])
     return best_matches, weights